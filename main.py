@@ -2,11 +2,47 @@ import os
 import subprocess
 import argparse
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event, Lock
+from typing import Iterator, Optional
 from zeep import Client
+from zeep.cache import SqliteCache
 from zeep.transports import Transport
+from zeep.xsd import ComplexType, BuiltinType
+from lxml import etree
 from requests import Session
-from textwrap import indent
-import shutil
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+log = logging.getLogger(__name__)
+
+# SOAP envelope (prefix, namespace) per SOAP version
+_SOAP12_ENV = ("soap12", "http://www.w3.org/2003/05/soap-envelope")
+_SOAP11_ENV = ("soap", "http://schemas.xmlsoap.org/soap/envelope/")
+
+# XSD built-in local name -> GraphQL scalar; anything unlisted maps to String!.
+# 64-bit xs:long/xs:unsignedLong stay String! since GraphQL Int is 32-bit.
+_XSD_TO_GQL = {
+    "int": "Int!",
+    "integer": "Int!",
+    "short": "Int!",
+    "byte": "Int!",
+    "unsignedInt": "Int!",
+    "unsignedShort": "Int!",
+    "unsignedByte": "Int!",
+    "positiveInteger": "Int!",
+    "negativeInteger": "Int!",
+    "nonPositiveInteger": "Int!",
+    "nonNegativeInteger": "Int!",
+    "float": "Float!",
+    "double": "Float!",
+    "decimal": "Float!",
+    "boolean": "Boolean!",
+}
+
+# Files/dirs whose presence means `stepzen init` already ran in a folder
+_WORKSPACE_MARKERS = ("stepzen.config.json", ".stepzen")
 
 
 class StepZenSOAPGenerator:
@@ -14,28 +50,40 @@ class StepZenSOAPGenerator:
     Generates StepZen GraphQL schema from a WSDL URL.
     """
 
-    def __init__(self, wsdl_url: str, api_name: str, base_folder: str):
+    def __init__(self, wsdl_url: str, api_name: str, base_folder: str, client: Optional[Client] = None):
         self.wsdl_url = wsdl_url
         self.api_name = api_name
         self.base_folder = base_folder
-        self.complex_type_registry = {}  # Stores named GraphQL types
+        self.complex_type_registry = {}  # Stores named GraphQL input types
+        self._type_cache: dict[int, str] = {}  # id(Zeep ComplexType) -> GraphQL type name
+        self._name_counts: dict[str, int] = {}  # type name hint -> next numeric suffix
 
-        # Setup SOAP client
-        session = Session()
-        session.verify = True
-        transport = Transport(session=session, timeout=12)
-        self.client = Client(wsdl_url, transport=transport)
+        # Setup SOAP client (reuse a prebuilt one when given)
+        self.client = client or self.build_client(wsdl_url)
         # Pick the first non-empty namespace from the WSDL
         self.tns = next((ns for prefix, ns in self.client.namespaces.items() if ns and prefix != "xsd"), "")
 
+    @staticmethod
+    def build_client(wsdl_url: str, cache: Optional[SqliteCache] = None) -> Client:
+        """
+        Build a Zeep client whose transport caches WSDL/XSD downloads on disk.
+        Pass a shared cache when building clients from several threads.
+        """
+        session = Session()
+        session.verify = True
+        # Keep connections (and their TLS sessions) warm across WSDL/XSD imports
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=Retry(total=3, backoff_factor=0.3))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        transport = Transport(session=session, timeout=12, cache=cache or SqliteCache(timeout=86400))
+        return Client(wsdl_url, transport=transport)
+
     # -----------------------------
     # Subprocess wrapper
     # -----------------------------
     @staticmethod
     def _run_stepzen_command(command, cwd=None):
-        print(f"[DEBUG] Running command: {' '.join(command)}")
-        print(f"[DEBUG] Working directory: {cwd}")
-        print(f"[DEBUG] :", os.getcwd())
+        log.debug("Running command: %s (cwd=%s)", " ".join(command), cwd)
         result = subprocess.run(command, cwd=cwd, text=True, capture_output=True)
         if result.returncode != 0:
             raise RuntimeError(f"[ERROR] StepZen command failed:\n{result.stderr}")
@@ -48,13 +96,18 @@ class StepZenSOAPGenerator:
         """
         Initialize StepZen workspace if not already initialized.
         """
+        # A stat on the workspace markers avoids a CLI cold start on re-runs
+        if any(os.path.exists(os.path.join(self.base_folder, m)) for m in _WORKSPACE_MARKERS):
+            log.info("StepZen workspace %s already exists. Skipping init.", self.base_folder)
+            return
         try:
-            print("[INFO] Attempting to initialize StepZen workspace...")
+            log.info("Attempting to initialize StepZen workspace %s...", self.base_folder)
             self._run_stepzen_command(["stepzen", "init"], cwd=self.base_folder)
-            print("[SUCCESS] StepZen workspace initialized.")
+            log.info("StepZen workspace %s initialized.", self.base_folder)
         except RuntimeError as e:
+            # The CLI may still detect a workspace we have no marker for (e.g. an enclosing one)
             if "already a StepZen workspace" in str(e):
-                print("[INFO] StepZen workspace already exists. Skipping init.")
+                log.info("StepZen workspace %s already exists. Skipping init.", self.base_folder)
             else:
                 raise
 
@@ -62,25 +115,11 @@ class StepZenSOAPGenerator:
         """
         Deploy StepZen endpoint.
         """
-        #schemas_folder = os.path.join(self.base_folder, "schemas")
-        #print("[INFO] Deploying StepZen endpoint...", self.api_name, " at ", cwd=self.base_folder)
-        print("[INFO] Deploying StepZen endpoint...")
-        moved = {}
-        for f in ["index.graphql", "schema.graphql"]:
-            print(f"[DEBUG] Looking for {f} to move to {os.getcwd()}")
-            for root, _, files in os.walk(self.base_folder):
-                print(f"[DEBUG] Checking in {root} for {f}")
-                print(f"[DEBUG] Files found: {files}")
-                if f in files :
-                    src, dst = os.path.join(root, f), os.path.join(os.getcwd(), f)
-                    print(f"[DEBUG] Moving {src} to {dst}")
-                    shutil.move(src, dst)
-                    moved[f] = src
-                    break
-        self._run_stepzen_command(["stepzen", "deploy", self.api_name], cwd=self.base_folder)
-        for f, original in moved.items():
-            shutil.move(os.path.join(os.getcwd(), f), original)
-        print("[SUCCESS] Endpoint deployed.")
+        log.info("Deploying StepZen endpoint %s...", self.api_name)
+        # generate_schema() writes index.graphql/schema.graphql straight into
+        # base_folder, so point the CLI there instead of shuffling files around.
+        self._run_stepzen_command(["stepzen", "deploy", self.api_name, "--dir", self.base_folder], cwd=self.base_folder)
+        log.info("Endpoint %s deployed.", self.api_name)
 
     # -----------------------------
     # Type mapping
@@ -89,41 +128,51 @@ class StepZenSOAPGenerator:
         """
         Map a Zeep XSD type to a GraphQL type.
         """
-        from zeep.xsd import ComplexType, BuiltinType
-
         # Handle built-in types
         if isinstance(el_type, BuiltinType):
-            xsd_name = el_type.name.lower()
-            gql_type = "String!"
-            if "int" in xsd_name:
-                gql_type = "Int!"
-            elif "float" in xsd_name or "double" in xsd_name or "decimal" in xsd_name:
-                gql_type = "Float!"
-            elif "bool" in xsd_name:
-                gql_type = "Boolean!"
+            gql_type = _XSD_TO_GQL.get(el_type.name, "String!")
 
         # Handle complex types
         elif isinstance(el_type, ComplexType):
-            type_name = type_name_hint
-            counter = 1
+            # Zeep reuses type objects, so a type shared across operations is mapped once
+            cached = self._type_cache.get(id(el_type))
+            if cached is not None:
+                return cached
+
+            # Next free suffix per hint, so repeated hints don't rescan Type, Type1, Type2, ...
+            counter = self._name_counts.get(type_name_hint, 0)
+            type_name = f"{type_name_hint}{counter}" if counter else type_name_hint
+            # Only loops when a suffixed name clashes with a literal hint (e.g. "Item" + 1 vs "Item1")
             while type_name in self.complex_type_registry:
-                type_name = f"{type_name_hint}{counter}"
                 counter += 1
+                type_name = f"{type_name_hint}{counter}"
+            self._name_counts[type_name_hint] = counter + 1
+            # Reserve the name before recursing so self-referential types terminate
+            self._type_cache[id(el_type)] = type_name
+            self.complex_type_registry[type_name] = None
+
+            try:
+                fields = []
+                # Every zeep element kind (Element, Any, indicators) sets min/max_occurs
+                for name, sub_type in el_type.elements:
+                    # .elements yields (name, element); indicators such as a repeated <choice> have no type
+                    sub_gql_type = self._map_xsd_to_graphql(getattr(sub_type, "type", None), type_name_hint=name)
+                    max_occurs = sub_type.max_occurs
+                    # Arrays are a non-null list of nullable items; optional fields drop the "!"
+                    if max_occurs is None or max_occurs == "unbounded" or max_occurs > 1:
+                        base = sub_gql_type[:-1] if sub_gql_type.endswith("!") else sub_gql_type
+                        sub_gql_type = f"[{base}]!"
+                    elif sub_type.min_occurs == 0 and sub_gql_type.endswith("!"):
+                        sub_gql_type = sub_gql_type[:-1]
+                    fields.append(f"{name}: {sub_gql_type}")
+            except Exception:
+                # Drop the reservation so a failed mapping leaves no None placeholder behind
+                del self.complex_type_registry[type_name]
+                del self._type_cache[id(el_type)]
+                self._name_counts[type_name_hint] = counter  # Hand the suffix back
+                raise
 
-            fields = []
-            for name, sub_type in el_type.elements:
-                sub_gql_type = self._map_xsd_to_graphql(sub_type, type_name_hint=name)
-                # Optional fields
-                min_occurs = getattr(sub_type, 'min_occurs', 1)
-                if min_occurs == 0 and sub_gql_type.endswith("!"):
-                    sub_gql_type = sub_gql_type.rstrip("!")
-                # Arrays
-                max_occurs = getattr(sub_type, 'max_occurs', 1)
-                if max_occurs is None or max_occurs > 1:
-                    sub_gql_type = f"[{sub_gql_type.rstrip('!')}]!"
-                fields.append(f"{name}: {sub_gql_type}")
-
-            self.complex_type_registry[type_name] = "type " + type_name + " {\n  " + "\n  ".join(fields) + "\n}"
+            self.complex_type_registry[type_name] = "input " + type_name + " {\n  " + "\n  ".join(fields) + "\n}"
             return type_name
 
         else:
@@ -135,31 +184,30 @@ class StepZenSOAPGenerator:
     # Build SOAP POST body
     # -----------------------------
     @staticmethod
-    def _build_postbody(action: str, soap_ns: str, args: list, soap_version: str = "soap12") -> str:
-        env_prefix = "soap12" if soap_version == "soap12" else "soap"
-        env_ns = "http://www.w3.org/2003/05/soap-envelope" if soap_version == "soap12" else "http://schemas.xmlsoap.org/soap/envelope/"
-        op_open = f'<{action} xmlns="{soap_ns}">' if soap_ns else f"<{action}>"
-        arg_lines = [f'  <{n}>{{{{ .Get "{n}" }}}}</{n}>' for n in args]
-        arg_block = "\n".join(arg_lines)
-
-        return f'''<?xml version="1.0" encoding="utf-8"?>
-<{env_prefix}:Envelope xmlns:{env_prefix}="{env_ns}">
-  <{env_prefix}:Body>
-    {op_open}
-{arg_block}
-    </{action}>
-  </{env_prefix}:Body>
-</{env_prefix}:Envelope>'''
+    def _iter_postbody_chunks(action: str, soap_ns: str, args: list, soap_version: str = "soap12",
+                              indent_prefix: str = "") -> Iterator[str]:
+        env_prefix, env_ns = _SOAP12_ENV if soap_version == "soap12" else _SOAP11_ENV
+        envelope = etree.Element(f"{{{env_ns}}}Envelope", nsmap={env_prefix: env_ns})
+        body = etree.SubElement(envelope, f"{{{env_ns}}}Body")
+        # Operation and args live in the target namespace, declared as default on the operation
+        qualify = f"{{{soap_ns}}}" if soap_ns else ""
+        op = etree.SubElement(body, f"{qualify}{action}", nsmap={None: soap_ns} if soap_ns else None)
+        for n in args:
+            etree.SubElement(op, f"{qualify}{n}").text = f'{{{{ .Get "{n}" }}}}'
+
+        # lxml escapes and serializes in C; only the block-string indent is added here
+        yield f'{indent_prefix}<?xml version="1.0" encoding="utf-8"?>\n'
+        for line in etree.tostring(envelope, encoding="unicode", pretty_print=True).splitlines(keepends=True):
+            yield indent_prefix
+            yield line
 
     # -----------------------------
     # Build SDL field for StepZen
     # -----------------------------
-    def _generate_field(self, op_name: str, arg_names: list, gql_args_sig: list, endpoint: str) -> str:
-        postbody_xml = self._build_postbody(op_name, self.tns, arg_names, "soap12")
-        args_signature = ", ".join(gql_args_sig)
-        field_signature = f"{op_name}({args_signature})" if args_signature else op_name
+    def _iter_field_chunks(self, op_name: str, arg_names: list, gql_args_sig: list, endpoint: str) -> Iterator[str]:
+        field_signature = f"{op_name}({', '.join(gql_args_sig)})" if gql_args_sig else op_name
 
-        return f'''  {field_signature} : JSON
+        yield f'''  {field_signature} : JSON
     @rest(
       endpoint: "{endpoint}"
       method: POST
@@ -167,47 +215,61 @@ class StepZenSOAPGenerator:
         {{name: "Content-Type", value: "text/xml; charset=utf-8"}}
       ]
       postbody: """
-{indent(postbody_xml, "        ")}
-      """
-      transforms: [{{pathpattern: "[]", editor: "xml2json"}}]
+'''
+        yield from self._iter_postbody_chunks(op_name, self.tns, arg_names, "soap12", indent_prefix="        ")
+        yield '''      """
+      transforms: [{pathpattern: "[]", editor: "xml2json"}]
       resultroot: "Envelope"
-    )'''
+    )
+'''
 
     # -----------------------------
     # Generate GraphQL schema + index
     # -----------------------------
     def generate_schema(self):
         os.makedirs(self.base_folder, exist_ok=True)
-        schema_fields = []
+        operations = []  # (op_name, arg_names, gql_args_sig, endpoint)
         seen_ops = set()
 
+        # Ports that share a binding expose the same operations; walk each binding once
+        bindings = {}  # id(binding) -> (binding, endpoint of the first port using it)
         for service in self.client.wsdl.services.values():
             for port in service.ports.values():
-                endpoint = port.binding_options.get("address") or self.wsdl_url.split("?")[0]
-                binding = port.binding
-
-                for op in binding._operations.values():
-                    op_name = op.name
-                    if op_name in seen_ops:
-                        continue
-                    seen_ops.add(op_name)
-
-                    arg_names = []
-                    gql_args_sig = []
-                    if op.input and op.input.body and op.input.body.type:
-                        for el_name, el_type in op.input.body.type.elements:
-                            arg_names.append(el_name)
-                            gql_args_sig.append(f"{el_name}: {self._map_xsd_to_graphql(el_type, type_name_hint=el_name)}")
-
-                    field = self._generate_field(op_name, arg_names, gql_args_sig, endpoint)
-                    schema_fields.append(field)
-
-        types_body = "\n\n".join(self.complex_type_registry.values())
-        schema_body = types_body + "\n\n" + "type Query {\n" + "\n\n".join(schema_fields) + "\n}\n"
-
+                if id(port.binding) not in bindings:
+                    endpoint = port.binding_options.get("address") or self.wsdl_url.split("?")[0]
+                    bindings[id(port.binding)] = (port.binding, endpoint)
+
+        for binding, endpoint in bindings.values():
+            for op in binding._operations.values():
+                op_name = op.name
+                # SOAP 1.1 and 1.2 ports usually have distinct bindings with the same operations
+                if op_name in seen_ops:
+                    continue
+                seen_ops.add(op_name)
+
+                arg_names = []
+                gql_args_sig = []
+                if op.input and op.input.body and op.input.body.type:
+                    for el_name, el_type in op.input.body.type.elements:
+                        arg_names.append(el_name)
+                        gql_args_sig.append(f"{el_name}: {self._map_xsd_to_graphql(getattr(el_type, 'type', None), type_name_hint=el_name)}")
+
+                operations.append((op_name, arg_names, gql_args_sig, endpoint))
+
+        # All types are registered once every operation is mapped, so the
+        # schema can be streamed to disk: types first, then Query fields.
         schema_path = os.path.join(self.base_folder, "schema.graphql")
-        with open(schema_path, "w") as f:
-            f.write(schema_body)
+        with open(schema_path, "w", buffering=1 << 16) as f:
+            for i, type_def in enumerate(self.complex_type_registry.values()):
+                if i:
+                    f.write("\n\n")
+                f.write(type_def)
+            f.write("\n\ntype Query {\n")
+            for i, (op_name, arg_names, gql_args_sig, endpoint) in enumerate(operations):
+                if i:
+                    f.write("\n")
+                f.writelines(self._iter_field_chunks(op_name, arg_names, gql_args_sig, endpoint))
+            f.write("}\n")
 
         index_body = '''schema @sdl(files: ["schema.graphql"]) {
   query: Query
@@ -217,7 +279,7 @@ class StepZenSOAPGenerator:
         with open(index_path, "w") as f:
             f.write(index_body)
 
-        print(f"[OK] Wrote schema.graphql and index.graphql in {self.base_folder}")
+        log.info("Wrote schema.graphql and index.graphql in %s", self.base_folder)
 
 
 # -----------------------------
@@ -227,22 +289,64 @@ def main():
     parser = argparse.ArgumentParser(description="Generate StepZen GraphQL schemas from WSDL config")
     parser.add_argument("--config", required=True, help="JSON file mapping API_NAME -> WSDL_URL")
     parser.add_argument("--output", required=True, help="Base folder for StepZen workspaces")
+    parser.add_argument("--verbose", action="store_true", help="Log StepZen commands and other debug output")
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    if args.verbose:
+        log.setLevel(logging.DEBUG)  # Keep zeep's own debug output quiet
+
     with open(args.config) as f:
         api_map = json.load(f)
 
-    for api_name, wsdl_url in api_map.items():
-        print(f"\n[INFO] Processing API '{api_name}' from WSDL '{wsdl_url}'")
-        api_folder = os.path.join(args.output, api_name.replace("/", "_"))
-        os.makedirs(api_folder, exist_ok=True)
-
-        generator = StepZenSOAPGenerator(wsdl_url, api_name, api_folder)
-        generator.init_workspace()
-        generator.generate_schema()
-        generator.deploy()
-
-    print("\n[SUCCESS] All APIs processed successfully.")
+    clients: dict[str, Client] = {}  # Parsed WSDLs, keyed by URL
+    # A single cache instance so all threads serialize sqlite writes on one lock
+    wsdl_cache = SqliteCache(timeout=86400)
+    # One lock per WSDL so APIs sharing a WSDL wait for a single fetch,
+    # while different WSDLs are fetched concurrently
+    client_locks = {wsdl_url: Lock() for wsdl_url in api_map.values()}
+
+    def get_client(wsdl_url: str) -> Client:
+        with client_locks[wsdl_url]:
+            if wsdl_url not in clients:
+                clients[wsdl_url] = StepZenSOAPGenerator.build_client(wsdl_url, cache=wsdl_cache)
+            return clients[wsdl_url]
+
+    # Set on the first failure so APIs that have not started yet are skipped
+    abort = Event()
+
+    def process_api(api_name: str, wsdl_url: str):
+        if abort.is_set():
+            log.info("Skipping API '%s' after an earlier failure", api_name)
+            return
+        try:
+            log.info("Processing API '%s' from WSDL '%s'", api_name, wsdl_url)
+            api_folder = os.path.join(args.output, api_name.replace("/", "_"))
+            os.makedirs(api_folder, exist_ok=True)
+
+            generator = StepZenSOAPGenerator(wsdl_url, api_name, api_folder, client=get_client(wsdl_url))
+            generator.init_workspace()
+            generator.generate_schema()
+            generator.deploy()
+        except Exception:
+            abort.set()
+            raise
+
+    # Each API is dominated by network I/O (WSDL fetch, stepzen deploy), so threads suffice
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(api_map)))) as executor:
+        futures = {executor.submit(process_api, api_name, wsdl_url): api_name
+                   for api_name, wsdl_url in api_map.items()}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception:
+                log.exception("Failed to process API '%s'", futures[future])
+                failed.append(futures[future])
+    if failed:
+        raise RuntimeError(f"[ERROR] Failed to process APIs: {', '.join(failed)}")
+
+    log.info("All APIs processed successfully.")
 
 
 if __name__ == "__main__":
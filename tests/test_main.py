@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from zeep import Client
+from zeep.xsd import ComplexType, Element, Sequence
+from zeep.xsd.types.builtins import Long, Short, String, UnsignedShort
+
+from main import StepZenSOAPGenerator
+
+WSDL = os.path.join(os.path.dirname(__file__), "sample.wsdl")
+
+
+def make_generator(base_folder="."):
+    return StepZenSOAPGenerator(WSDL, "test/api", base_folder, client=Client(WSDL))
+
+
+def generate_schema():
+    with tempfile.TemporaryDirectory() as folder:
+        generator = make_generator(folder)
+        generator.generate_schema()
+        with open(os.path.join(folder, "schema.graphql")) as f:
+            return generator, f.read()
+
+
+def render_postbody(*args):
+    return "".join(StepZenSOAPGenerator._iter_postbody_chunks(*args))
+
+
+class ComplexTypeRegistryTest(unittest.TestCase):
+    def test_shared_type_registered_once(self):
+        # Item is used by both operations and refers to itself through Child
+        generator, schema = generate_schema()
+        self.assertEqual(list(generator.complex_type_registry), ["item"])
+        self.assertEqual(schema.count("input item {"), 1)
+
+    def test_failed_mapping_releases_reserved_name(self):
+        generator = make_generator()
+        # A non-numeric max_occurs makes the field mapping raise mid-way
+        bad = ComplexType(Sequence([Element("Code", String(), max_occurs="2")]))
+        with self.assertRaises(TypeError):
+            generator._map_xsd_to_graphql(bad, "item")
+        self.assertEqual(generator.complex_type_registry, {})
+
+        good = ComplexType(Sequence([Element("Code", String())]))
+        self.assertEqual(generator._map_xsd_to_graphql(good, "item"), "item")
+
+
+class BuiltinTypeTest(unittest.TestCase):
+    def test_builtin_table(self):
+        generator = make_generator()
+        self.assertEqual(generator._map_xsd_to_graphql(Short(), "a"), "Int!")
+        self.assertEqual(generator._map_xsd_to_graphql(UnsignedShort(), "a"), "Int!")
+        # GraphQL Int is 32-bit, so xs:long stays a string
+        self.assertEqual(generator._map_xsd_to_graphql(Long(), "a"), "String!")
+        # Names missing from the table fall back to String!
+        self.assertEqual(generator._map_xsd_to_graphql(String(), "a"), "String!")
+
+    def test_schema_arguments_use_element_types(self):
+        _, schema = generate_schema()
+        self.assertIn("A(sCode: String!, n: Int!, item: item) : JSON", schema)
+        self.assertIn("B(item: item, x: Float!, ok: Boolean!) : JSON", schema)
+
+
+class PostbodyTest(unittest.TestCase):
+    def test_namespace_is_escaped(self):
+        self.assertEqual(render_postbody("Op", "http://a?x=1&y=2", ["q"]), '''<?xml version="1.0" encoding="utf-8"?>
+<soap12:Envelope xmlns:soap12="http://www.w3.org/2003/05/soap-envelope">
+  <soap12:Body>
+    <Op xmlns="http://a?x=1&amp;y=2">
+      <q>{{ .Get "q" }}</q>
+    </Op>
+  </soap12:Body>
+</soap12:Envelope>
+''')
+
+    def test_operation_without_arguments(self):
+        self.assertEqual(render_postbody("Op", "", [], "soap11", "  "), '''  <?xml version="1.0" encoding="utf-8"?>
+  <soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+    <soap:Body>
+      <Op/>
+    </soap:Body>
+  </soap:Envelope>
+''')
+
+
+class OccursTest(unittest.TestCase):
+    def test_unbounded_and_optional_fields(self):
+        _, schema = generate_schema()
+        self.assertIn("  Tags: [String]!\n", schema)
+        # xs:unsignedInt with minOccurs="0" loses its "!"
+        self.assertIn("  Qty: Int\n", schema)